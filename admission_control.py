@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterator
+
+# Fixed overhead of one analysis job (interpreter, libmagic, buffers)
+BASE_MEMORY_COST = 32 * 1024 * 1024
+# Assumed expansion of compressed archives whose members are not listed cheaply
+COMPRESSION_RATIO = 4
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job cannot be admitted within the configured limits."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_cost(filepath: str) -> Dict[str, int]:
+    """Estimate the CPU, memory and disk cost of processing an archive.
+
+    CPU is measured in files to analyze, memory and disk in bytes. ZIP and
+    plain TAR archives are listed from their headers; gzipped archives are
+    estimated from their compressed size, since listing them means
+    decompressing the whole stream.
+    """
+    import zipfile
+    import tarfile
+    upload_size = os.path.getsize(filepath)
+    member_count = 0
+    uncompressed_size = 0
+    largest_member = 0
+
+    try:
+        if filepath.endswith('.zip'):
+            with zipfile.ZipFile(filepath, 'r') as zip_ref:
+                for info in zip_ref.infolist():
+                    if not info.is_dir():
+                        member_count += 1
+                        uncompressed_size += info.file_size
+                        largest_member = max(largest_member, info.file_size)
+        elif filepath.endswith('.tar'):
+            with tarfile.open(filepath, 'r:') as tar_ref:
+                for info in tar_ref:
+                    if info.isfile():
+                        member_count += 1
+                        uncompressed_size += info.size
+                        largest_member = max(largest_member, info.size)
+    except (zipfile.BadZipFile, tarfile.ReadError):
+        # Invalid archives are rejected by extraction later on
+        pass
+
+    if not member_count:
+        uncompressed_size = upload_size * COMPRESSION_RATIO
+        largest_member = uncompressed_size
+        member_count = max(1, uncompressed_size // (64 * 1024))
+
+    return {
+        'cpu': member_count,
+        # Analysis reads every file whole, so the largest one dominates
+        'memory': BASE_MEMORY_COST + 2 * largest_member,
+        # Upload, extracted tree and output package exist at the same time
+        'disk': upload_size + 2 * uncompressed_size,
+    }
+
+
+def estimate_disk_cost(filename: str, size: int) -> int:
+    """Estimate the workspace bytes of an archive known only by name and size.
+
+    Gzipped archives are costed exactly as in estimate_cost(). ZIP and plain
+    TAR archives are assumed to hold their own size, a lower bound that
+    their listing refines once the archive has arrived.
+    """
+    uncompressed_size = size * COMPRESSION_RATIO if filename.endswith(('.gz', '.tgz')) else size
+    return size + 2 * uncompressed_size
+
+
+def estimate_tree_cost(file_sizes: List[int], analyzed_files: int) -> Dict[str, int]:
+    """Estimate the cost of packaging a file tree of which only some files are analyzed."""
+    return {
+        'cpu': max(1, analyzed_files),
+        'memory': BASE_MEMORY_COST + 2 * max(file_sizes, default=0),
+        # Materialized tree and output package
+        'disk': 2 * sum(file_sizes),
+    }
+
+
+class AdmissionController:
+    """Admit jobs against CPU, memory and disk budgets shared by all workers.
+
+    State lives in a JSON file guarded by an exclusive ``flock`` so that every
+    gunicorn worker on the host sees the same in-flight cost and queue.
+    Entries left behind by killed workers are reaped by pid and age.
+    """
+
+    RESOURCES = ('cpu', 'memory', 'disk')
+
+    def __init__(self, state_file: str, budgets: Dict[str, int], queue_timeout: float = 10.0,
+                 max_queue: int = 16, poll_interval: float = 0.25, stale_after: float = 300.0):
+        self.state_file = state_file
+        self.budgets = budgets
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[Dict[str, Any]]:
+        """Load the shared state under an exclusive lock and write it back."""
+        with open(self.state_file, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    state = {}
+                state.setdefault('in_flight', {})
+                state.setdefault('waiting', {})
+                state.setdefault('counters', {'admitted': 0, 'queued': 0, 'rejected': 0})
+                state.setdefault('avg_duration', 1.0)
+                self._reap(state)
+
+                yield state
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                # Flush before unlocking, closing the file would be too late
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _reap(self, state: Dict[str, Any]):
+        """Drop entries owned by dead processes or older than ``stale_after``."""
+        now = time.time()
+        for key in ('in_flight', 'waiting'):
+            for ticket, entry in list(state[key].items()):
+                if now - entry['since'] > self.stale_after or not self._pid_alive(entry['pid']):
+                    del state[key][ticket]
+
+    @staticmethod
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _in_flight_cost(self, state: Dict[str, Any]) -> Dict[str, int]:
+        return {
+            resource: sum(entry['cost'][resource] for entry in state['in_flight'].values())
+            for resource in self.RESOURCES
+        }
+
+    def _fits(self, state: Dict[str, Any], cost: Dict[str, int]) -> bool:
+        # A job larger than a whole budget still runs once nothing else does
+        if not state['in_flight']:
+            return True
+        used = self._in_flight_cost(state)
+        return all(used[r] + cost[r] <= self.budgets[r] for r in self.RESOURCES)
+
+    def _is_next(self, state: Dict[str, Any], ticket: str) -> bool:
+        """Return whether ticket is first in line, so waiting jobs are never passed."""
+        waiting = state['waiting']
+        if not waiting:
+            return True
+        return ticket == min(waiting, key=lambda t: (waiting[t]['since'], t))
+
+    def _retry_after(self, state: Dict[str, Any]) -> int:
+        return max(1, int(state['avg_duration'] * (len(state['waiting']) + 1)))
+
+    @contextmanager
+    def admit(self, cost: Dict[str, int]) -> Iterator[None]:
+        """Run the enclosed block once ``cost`` fits the budgets.
+
+        Jobs are admitted first come, first served: while others are waiting
+        a job joins the end of the queue, and only the job at its head is
+        admitted once it fits, so small jobs cannot starve a large one.
+
+        Waits up to ``queue_timeout`` seconds and raises AdmissionRejected
+        if the job is still not admitted or the queue is already full.
+        """
+        ticket = uuid.uuid4().hex
+        entry = {'pid': os.getpid(), 'cost': cost}
+        deadline = time.time() + self.queue_timeout
+
+        while True:
+            with self._locked_state() as state:
+                rejected = None
+                if self._is_next(state, ticket) and self._fits(state, cost):
+                    state['waiting'].pop(ticket, None)
+                    state['in_flight'][ticket] = dict(entry, since=time.time())
+                    state['counters']['admitted'] += 1
+                    break
+
+                if ticket not in state['waiting']:
+                    if len(state['waiting']) >= self.max_queue:
+                        rejected = self._retry_after(state)
+                    else:
+                        state['waiting'][ticket] = dict(entry, since=time.time())
+                        state['counters']['queued'] += 1
+                elif time.time() >= deadline:
+                    del state['waiting'][ticket]
+                    rejected = self._retry_after(state)
+
+                if rejected is not None:
+                    state['counters']['rejected'] += 1
+
+            if rejected is not None:
+                raise AdmissionRejected('Server is busy, please retry later', rejected)
+            time.sleep(self.poll_interval)
+
+        started = time.time()
+        try:
+            yield
+        finally:
+            with self._locked_state() as state:
+                state['in_flight'].pop(ticket, None)
+                # Exponential moving average used for Retry-After hints
+                state['avg_duration'] = 0.8 * state['avg_duration'] + 0.2 * (time.time() - started)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return queue depth, in-flight cost and admission counters."""
+        with self._locked_state() as state:
+            return {
+                'in_flight': len(state['in_flight']),
+                'in_flight_cost': self._in_flight_cost(state),
+                'budgets': self.budgets,
+                'queue_depth': len(state['waiting']),
+                'admitted_total': state['counters']['admitted'],
+                'queued_total': state['counters']['queued'],
+                'rejected_total': state['counters']['rejected'],
+                'avg_duration_seconds': round(state['avg_duration'], 3),
+            }
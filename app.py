@@ -1,42 +1,167 @@
 import os
-import json
-import magic
-import yaml
-import zipfile
-import tarfile
 import shutil
-import chardet
-from flask import Flask, request, jsonify, send_file, render_template, send_from_directory
+import tempfile
+from flask import Flask, Blueprint, current_app, request, jsonify, send_file, render_template, send_from_directory
 from flask_cors import CORS
+from werkzeug.local import LocalProxy
 from werkzeug.utils import secure_filename
-from project_analyzer import ProjectAnalyzer
+from project_analyzer import ProjectAnalyzer, get_mime_detector
 from docker_generator import DockerGenerator
-
-app = Flask(__name__, 
-    static_folder='static',
-    template_folder='templates'
-)
-CORS(app)
+from chunked_upload import ChunkedUploadManager, UploadQuotaExceeded, DEFAULT_CHUNK_SIZE
+from admission_control import AdmissionController, AdmissionRejected, estimate_cost, estimate_disk_cost, estimate_tree_cost
+from workspace import WorkspaceManager, WorkspaceFull, memory_root
+from project_cache import ProjectCache, check_manifest_paths, result_key
 
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'output'
 EXTRACT_FOLDER = 'extracted'
 ALLOWED_EXTENSIONS = {'zip', 'tar', 'gz'}
+MAX_PREVIEW_FILES = 200
+MAX_MANIFEST_FILES = 50000
+KEY_FILES = ('package.json', 'requirements.txt', 'pom.xml', 'Gemfile', 'composer.json', 'go.mod', 'Cargo.toml')
+
+bp = Blueprint('dockerbuilder', __name__)
+
+# Per-app services, created in create_app()
+chunked_uploads = LocalProxy(lambda: current_app.extensions['chunked_uploads'])
+admission = LocalProxy(lambda: current_app.extensions['admission'])
+workspaces = LocalProxy(lambda: current_app.extensions['workspaces'])
+upload_janitor = LocalProxy(lambda: current_app.extensions['upload_janitor'])
+project_cache = LocalProxy(lambda: current_app.extensions['project_cache'])
+project_janitor = LocalProxy(lambda: current_app.extensions['project_janitor'])
+
+class InvalidArchive(ValueError):
+    """Raised when an uploaded archive cannot be read."""
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
-app.config['EXTRACT_FOLDER'] = EXTRACT_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+def create_app():
+    """Create and configure the Flask application.
+    
+    Nothing here loads libmagic or chardet, so importing this module stays
+    cheap; call warm_up() in a preloading parent to share those with its
+    forked workers.
+    """
+    app = Flask(__name__, 
+        static_folder='static',
+        template_folder='templates'
+    )
+    CORS(app)
+    
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
+    app.config['EXTRACT_FOLDER'] = EXTRACT_FOLDER
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max request size
+    app.config['UPLOAD_CHUNK_SIZE'] = DEFAULT_CHUNK_SIZE
+    # Total declared size of all chunked uploads on disk at once
+    app.config['UPLOAD_TOTAL_BUDGET'] = int(os.environ.get('UPLOAD_TOTAL_BUDGET', 8 * 1024 * 1024 * 1024))
+    
+    # Per-request workspaces, on disk or RAM-backed (tmpfs, /dev/shm)
+    app.config['WORKSPACE_BACKEND'] = os.environ.get('WORKSPACE_BACKEND', 'disk')
+    app.config['WORKSPACE_ROOT'] = os.environ.get(
+        'WORKSPACE_ROOT', memory_root() if app.config['WORKSPACE_BACKEND'] == 'memory' else EXTRACT_FOLDER
+    )
+    app.config['WORKSPACE_MAX_BYTES'] = int(os.environ.get('WORKSPACE_MAX_BYTES', 1024 * 1024 * 1024))
+    app.config['WORKSPACE_TOTAL_BUDGET'] = int(os.environ.get('WORKSPACE_TOTAL_BUDGET', 4 * 1024 * 1024 * 1024))
+    app.config['WORKSPACE_MAX_AGE'] = float(os.environ.get('WORKSPACE_MAX_AGE', 3600))
+    # Largest chunked upload whose extracted tree can still fit a workspace:
+    # upload, extracted tree and package take at least three times its size
+    app.config['MAX_UPLOAD_SIZE'] = int(os.environ.get('MAX_UPLOAD_SIZE', app.config['WORKSPACE_MAX_BYTES'] // 3))
+    # Total size of projects kept on disk for delta uploads
+    app.config['PROJECT_TOTAL_BUDGET'] = int(os.environ.get('PROJECT_TOTAL_BUDGET', 8 * 1024 * 1024 * 1024))
+    # Chunked uploads that received nothing for this long are abandoned
+    app.config['UPLOAD_IDLE_TIMEOUT'] = float(os.environ.get('UPLOAD_IDLE_TIMEOUT', 900))
+    
+    # Admission control budgets shared by all workers on the host. Jobs
+    # write to their workspace, so with RAM-backed workspaces the disk
+    # budget defaults to the workspace budget and a full /dev/shm shows up
+    # as 429 instead of failed writes
+    default_disk_budget = (
+        app.config['WORKSPACE_TOTAL_BUDGET'] if app.config['WORKSPACE_BACKEND'] == 'memory'
+        else 4 * 1024 * 1024 * 1024
+    )
+    app.config['ADMISSION_CPU_BUDGET'] = int(os.environ.get('ADMISSION_CPU_BUDGET', 20000))  # files in flight
+    app.config['ADMISSION_MEMORY_BUDGET'] = int(os.environ.get('ADMISSION_MEMORY_BUDGET', 1024 * 1024 * 1024))
+    app.config['ADMISSION_DISK_BUDGET'] = int(os.environ.get('ADMISSION_DISK_BUDGET', default_disk_budget))
+    app.config['ADMISSION_QUEUE_TIMEOUT'] = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 10))
+    app.config['ADMISSION_MAX_QUEUE'] = int(os.environ.get('ADMISSION_MAX_QUEUE', 16))
+    app.config['ADMISSION_STATE_FILE'] = os.environ.get(
+        'ADMISSION_STATE_FILE', os.path.join(tempfile.gettempdir(), 'dockerbuilder-admission.json')
+    )
+    
+    # Ensure required directories exist
+    for directory in [UPLOAD_FOLDER, OUTPUT_FOLDER, EXTRACT_FOLDER, 'static', 'templates']:
+        os.makedirs(directory, exist_ok=True)
+    
+    uploads = ChunkedUploadManager(
+        os.path.join(UPLOAD_FOLDER, 'chunked'),
+        chunk_size=app.config['UPLOAD_CHUNK_SIZE'],
+        max_size=app.config['MAX_UPLOAD_SIZE'],
+        max_total_size=app.config['UPLOAD_TOTAL_BUDGET'],
+        idle_timeout=app.config['UPLOAD_IDLE_TIMEOUT']
+    )
+    app.extensions['chunked_uploads'] = uploads
+    
+    app.extensions['admission'] = AdmissionController(
+        app.config['ADMISSION_STATE_FILE'],
+        budgets={
+            'cpu': app.config['ADMISSION_CPU_BUDGET'],
+            'memory': app.config['ADMISSION_MEMORY_BUDGET'],
+            'disk': app.config['ADMISSION_DISK_BUDGET'],
+        },
+        queue_timeout=app.config['ADMISSION_QUEUE_TIMEOUT'],
+        max_queue=app.config['ADMISSION_MAX_QUEUE']
+    )
+    
+    app.extensions['workspaces'] = WorkspaceManager(
+        app.config['WORKSPACE_ROOT'],
+        max_bytes=app.config['WORKSPACE_MAX_BYTES'],
+        total_budget=app.config['WORKSPACE_TOTAL_BUDGET'],
+        max_age=app.config['WORKSPACE_MAX_AGE'],
+        logger=app.logger
+    )
+    
+    # Chunked uploads persist across requests so they can resume; the same
+    # janitor evicts the ones that went idle (every chunk touches the upload
+    # directory), but never one still receiving chunks to stay within the budget
+    app.extensions['upload_janitor'] = WorkspaceManager(
+        uploads.base_folder,
+        max_bytes=app.config['MAX_UPLOAD_SIZE'],
+        total_budget=app.config['UPLOAD_TOTAL_BUDGET'],
+        max_age=app.config['UPLOAD_IDLE_TIMEOUT'],
+        logger=app.logger,
+        in_use=lambda path: uploads.in_progress(os.path.basename(path))
+    )
+    
+    # Files and per-file analysis results of projects re-uploaded as deltas
+    projects = ProjectCache(os.path.join(UPLOAD_FOLDER, 'projects'))
+    app.extensions['project_cache'] = projects
+    app.extensions['project_janitor'] = WorkspaceManager(
+        projects.base_folder,
+        max_bytes=app.config['MAX_UPLOAD_SIZE'],
+        total_budget=app.config['PROJECT_TOTAL_BUDGET'],
+        max_age=7 * 24 * 3600,
+        logger=app.logger
+    )
+    
+    app.register_blueprint(bp)
+    return app
 
-# Ensure required directories exist
-for directory in [UPLOAD_FOLDER, OUTPUT_FOLDER, EXTRACT_FOLDER, 'static', 'templates']:
-    os.makedirs(directory, exist_ok=True)
+def warm_up(app):
+    """Load everything request handlers need ahead of the first request.
+    
+    Run in the gunicorn master with preload_app, so that libmagic's database,
+    chardet's models and the compiled templates are loaded once and shared
+    copy-on-write by every forked worker.
+    """
+    import chardet  # noqa: F401
+    get_mime_detector()
+    app.jinja_env.get_template('index.html')
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def detect_encoding(file_path):
     """Detect the encoding of a file."""
+    import chardet
     with open(file_path, 'rb') as f:
         raw_data = f.read()
         result = chardet.detect(raw_data)
@@ -44,23 +169,32 @@ def detect_encoding(file_path):
 
 def is_binary_file(file_path):
     """Check if a file is binary."""
-    mime = magic.Magic(mime=True)
-    file_type = mime.from_file(file_path)
+    file_type = get_mime_detector().from_file(file_path)
     return not file_type.startswith('text/')
 
 def extract_archive(filepath, extract_to):
     """Extract the uploaded archive to the specified directory."""
+    import zipfile
+    import tarfile
     if filepath.endswith('.zip'):
-        with zipfile.ZipFile(filepath, 'r') as zip_ref:
-            zip_ref.extractall(extract_to)
+        try:
+            with zipfile.ZipFile(filepath, 'r') as zip_ref:
+                zip_ref.extractall(extract_to)
+        except zipfile.BadZipFile:
+            raise InvalidArchive('Invalid ZIP file')
     elif filepath.endswith(('.tar', '.tar.gz', '.tgz')):
-        with tarfile.open(filepath, 'r:*') as tar_ref:
-            tar_ref.extractall(extract_to)
+        try:
+            with tarfile.open(filepath, 'r:*') as tar_ref:
+                tar_ref.extractall(extract_to)
+        except tarfile.ReadError:
+            raise InvalidArchive('Invalid TAR file')
     else:
         raise ValueError(f"Unsupported archive format: {filepath}")
 
 def create_dockerized_project(project_dir, docker_configs, output_path, format):
     """Create a new archive containing the project and Docker configurations."""
+    import zipfile
+    import tarfile
     if format == 'zip':
         with zipfile.ZipFile(output_path, 'w') as zipf:
             # Add project files
@@ -96,26 +230,152 @@ def remove_macos_folders(directory):
 
 def find_project_root(directory):
     """Find the actual project root directory by looking for key files."""
-    key_files = ['package.json', 'requirements.txt', 'pom.xml', 'Gemfile', 'composer.json', 'go.mod', 'Cargo.toml']
-    
     # First check the current directory
-    if any(os.path.exists(os.path.join(directory, f)) for f in key_files):
+    if any(os.path.exists(os.path.join(directory, f)) for f in KEY_FILES):
         return directory
     
     # Then check immediate subdirectories
     for item in os.listdir(directory):
         item_path = os.path.join(directory, item)
         if os.path.isdir(item_path):
-            if any(os.path.exists(os.path.join(item_path, f)) for f in key_files):
+            if any(os.path.exists(os.path.join(item_path, f)) for f in KEY_FILES):
                 return item_path
     
     return directory
 
-@app.route('/')
+@bp.before_app_request
+def start_workspace_janitor():
+    # Started lazily so that every forked worker runs its own janitor
+    workspaces.start_janitor()
+    upload_janitor.start_janitor()
+    project_janitor.start_janitor()
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/analyze', methods=['POST'])
+def busy_response(error):
+    """Build a 429 response telling the client when to retry."""
+    response = jsonify({'error': str(error)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def workspace_full_response(error):
+    return jsonify({'error': str(error)}), 413
+
+def send_from_workspace(output_path):
+    """Send the output package independently of its workspace.
+    
+    The open file keeps the package readable after the workspace has been
+    released, so nothing is left behind if the client disconnects.
+    """
+    package = open(output_path, 'rb')
+    return send_file(package, as_attachment=True, download_name=os.path.basename(output_path))
+
+def parse_build_options(form):
+    """Read host, port and output format from the submitted form."""
+    host = form.get('host', '0.0.0.0')
+    port = form.get('port', '5000')
+    output_format = form.get('format', 'zip')
+    
+    # Validate port number
+    try:
+        port_num = int(port)
+    except ValueError:
+        raise ValueError('Invalid port number')
+    if not (1 <= port_num <= 65535):
+        raise ValueError('Port number must be between 1 and 65535')
+    
+    return host, port, output_format
+
+def build_dockerized_project(workspace_path, filepath, host, port, output_format, keep_project=False):
+    """Extract and analyze an uploaded archive.
+    
+    All intermediate files are written below ``workspace_path``. With
+    keep_project, the extracted files and their analysis results are kept in
+    the project cache so the next build can be sent as a delta. Returns the
+    output package path and the kept project's id, or None. Raises
+    WorkspaceFull if the project exceeds the workspace size cap and
+    AdmissionRejected if the server is too busy to take the job.
+    """
+    cost = estimate_cost(filepath)
+    workspaces.check_fits(cost['disk'])
+    
+    with admission.admit(cost):
+        # Extract the archive
+        extract_path = os.path.join(workspace_path, 'extracted')
+        extract_archive(filepath, extract_path)
+        
+        project_id = None
+        if keep_project:
+            try:
+                project_id = project_cache.import_tree(extract_path)
+            except OSError as e:
+                # Only the next delta is lost, the build itself goes on
+                current_app.logger.warning(f"Could not keep project files: {str(e)}")
+        
+        output_path, file_results = dockerize_extracted(workspace_path, host, port, output_format)
+        
+        if project_id:
+            manifest = project_cache.manifest(project_id)
+            project_cache.store_results(project_id, {
+                result_key(manifest[path], path): result
+                for path, result in file_results.items()
+                if path in manifest
+            })
+        return output_path, project_id
+
+def dockerize_extracted(workspace_path, host, port, output_format, known_results=None):
+    """Analyze the project in a workspace and package it with its Docker configurations.
+    
+    known_results maps paths relative to the extracted tree to cached
+    ProjectAnalyzer.analyze_file() results of unchanged files. Returns the
+    output package path and the per-file results, keyed the same way.
+    """
+    extract_path = os.path.join(workspace_path, 'extracted')
+    output_dir = os.path.join(workspace_path, 'output')
+    
+    # Remove _MACOS folders
+    remove_macos_folders(extract_path)
+    
+    # Find the actual project root
+    project_root = find_project_root(extract_path)
+    root_prefix = os.path.relpath(project_root, extract_path)
+    
+    # Analyze the project with encoding detection
+    analyzer = ProjectAnalyzer(project_root)
+    analysis_result = analyzer.analyze(known_results={
+        os.path.relpath(os.path.join(extract_path, path), project_root): result
+        for path, result in (known_results or {}).items()
+    })
+    file_results = {
+        os.path.normpath(os.path.join(root_prefix, entry['path'])): {
+            'language': entry['language'],
+            'dependencies': entry['dependencies']
+        }
+        for entry in analysis_result['files']
+    }
+    
+    # Update port in analysis result
+    analysis_result['port'] = port
+    
+    # Generate Docker configurations with custom host and port
+    generator = DockerGenerator(analysis_result, output_dir=output_dir)
+    docker_configs = generator.generate(host=host, port=port)
+    
+    # Create output package with project and Docker files
+    output_filename = f"dockerized_project.{output_format}"
+    output_path = os.path.join(output_dir, output_filename)
+    
+    create_dockerized_project(project_root, docker_configs, output_path, output_format)
+    
+    # The extracted tree is no longer needed while the package is sent
+    shutil.rmtree(extract_path, ignore_errors=True)
+    
+    return output_path, file_results
+
+@bp.route('/api/analyze', methods=['POST'])
 def analyze_project():
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
@@ -127,78 +387,293 @@ def analyze_project():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Invalid file type'}), 400
     
+    # Get configuration options
+    try:
+        host, port, output_format = parse_build_options(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    workspace_path = workspaces.acquire()
     try:
-        # Get configuration options
-        host = request.form.get('host', '0.0.0.0')
-        port = request.form.get('port', '5000')
-        output_format = request.form.get('format', 'zip')
-        
-        # Validate port number
-        try:
-            port_num = int(port)
-            if not (1 <= port_num <= 65535):
-                return jsonify({'error': 'Port number must be between 1 and 65535'}), 400
-        except ValueError:
-            return jsonify({'error': 'Invalid port number'}), 400
-        
         # Save the uploaded file
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        filepath = os.path.join(workspace_path, 'upload', filename)
         file.save(filepath)
         
-        # Create a unique extraction directory
-        project_name = os.path.splitext(filename)[0]
-        extract_path = os.path.join(app.config['EXTRACT_FOLDER'], project_name)
-        os.makedirs(extract_path, exist_ok=True)
-        
-        # Extract the archive
-        extract_archive(filepath, extract_path)
-        
-        # Remove _MACOS folders
-        remove_macos_folders(extract_path)
+        output_path, _ = build_dockerized_project(workspace_path, filepath, host, port, output_format)
         
-        # Find the actual project root
-        project_root = find_project_root(extract_path)
+        return send_from_workspace(output_path)
+    
+    except AdmissionRejected as e:
+        return busy_response(e)
+    except WorkspaceFull as e:
+        return workspace_full_response(e)
+    except InvalidArchive as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error processing file: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        # Cleanup
+        workspaces.release(workspace_path)
+
+@bp.route('/api/preview', methods=['POST'])
+def preview_project():
+    """Generate Docker configurations from a subset of manifests and key files.
+    
+    The browser reads the archive locally and only sends the files the
+    analysis depends on, so the Dockerfile can be shown before the full
+    archive is uploaded.
+    """
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    if len(files) > MAX_PREVIEW_FILES:
+        return jsonify({'error': f'Too many files (max {MAX_PREVIEW_FILES})'}), 400
+    
+    try:
+        host, port, _ = parse_build_options(request.form)
+        check_manifest_paths([file.filename or '' for file in files])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    workspace_path = workspaces.acquire()
+    try:
+        # Recreate the selected files at their archive paths
+        project_path = os.path.join(workspace_path, 'extracted')
+        for file in files:
+            file_path = os.path.join(project_path, file.filename)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            file.save(file_path)
         
-        # Analyze the project with encoding detection
-        analyzer = ProjectAnalyzer(project_root)
-        analysis_result = analyzer.analyze()
+        remove_macos_folders(project_path)
+        project_root = find_project_root(project_path)
         
-        # Update port in analysis result
+        analysis_result = ProjectAnalyzer(project_root).analyze()
         analysis_result['port'] = port
         
-        # Generate Docker configurations with custom host and port
-        generator = DockerGenerator(analysis_result)
+        generator = DockerGenerator(analysis_result, output_dir=os.path.join(workspace_path, 'output'))
         docker_configs = generator.generate(host=host, port=port)
         
-        # Create output package with project and Docker files
-        output_filename = f"dockerized_project.{output_format}"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-        
-        create_dockerized_project(project_root, docker_configs, output_path, output_format)
+        configs = {}
+        for config_file in docker_configs:
+            with open(config_file) as f:
+                configs[os.path.basename(config_file)] = f.read()
         
-        return send_file(output_path, as_attachment=True)
+        return jsonify({
+            'language': analysis_result['language'],
+            'framework': generator.detect_framework(),
+            'dependencies': analysis_result['dependencies'],
+            'configs': configs
+        })
     
-    except zipfile.BadZipFile:
-        return jsonify({'error': 'Invalid ZIP file'}), 400
-    except tarfile.ReadError:
-        return jsonify({'error': 'Invalid TAR file'}), 400
     except Exception as e:
-        app.logger.error(f"Error processing file: {str(e)}")
+        current_app.logger.error(f"Error generating preview: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        workspaces.release(workspace_path)
+
+@bp.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable chunked upload."""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    filename = data.get('filename', '')
+    
+    if not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type'}), 400
+    
+    try:
+        size = int(data.get('size', 0))
+        chunk_size = int(data['chunk_size']) if data.get('chunk_size') else None
+        # Refuse projects too large for a workspace before they are uploaded
+        workspaces.check_fits(estimate_disk_cost(filename, size))
+        upload = chunked_uploads.create(filename, size, chunk_size)
+    except WorkspaceFull as e:
+        return workspace_full_response(e)
+    except UploadQuotaExceeded as e:
+        return jsonify({'error': str(e)}), 507
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(upload), 201
+
+@bp.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Report which chunks of an upload have been received."""
+    try:
+        return jsonify(chunked_uploads.status(upload_id))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+
+@bp.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Store one chunk at the offset given in the query string."""
+    try:
+        offset = int(request.args.get('offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Invalid chunk offset'}), 400
+    
+    try:
+        status = chunked_uploads.write_chunk(
+            upload_id, offset, request.get_data(cache=False),
+            checksum=request.headers.get('X-Chunk-SHA256')
+        )
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(status)
+
+@bp.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """Assemble a completed upload and run it through the analyze pipeline."""
+    try:
+        host, port, output_format = parse_build_options(request.form)
+        upload = chunked_uploads.finalize(upload_id)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    workspace_path = workspaces.acquire()
+    keep_upload = False
+    try:
+        output_path, project_id = build_dockerized_project(
+            workspace_path, upload['filepath'], host, port, output_format,
+            keep_project=request.form.get('keep_project') == '1'
+        )
+        response = send_from_workspace(output_path)
+        if project_id:
+            response.headers['X-Project-Id'] = project_id
+        # SHA-256 of the chunk digests, see ChunkedUploadManager.finalize()
+        response.headers['X-Upload-Chunk-Digest'] = upload['chunk_digest']
+        return response
+    
+    except AdmissionRejected as e:
+        # Keep the chunks so the client can retry finalize without re-uploading
+        keep_upload = True
+        return busy_response(e)
+    except WorkspaceFull as e:
+        return workspace_full_response(e)
+    except InvalidArchive as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error processing file: {str(e)}")
         return jsonify({'error': str(e)}), 500
     finally:
         # Cleanup
+        workspaces.release(workspace_path)
         try:
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            if os.path.exists(extract_path):
-                shutil.rmtree(extract_path)
+            if not keep_upload:
+                chunked_uploads.discard(upload_id)
         except Exception as e:
-            app.logger.error(f"Error cleaning up: {str(e)}")
+            current_app.logger.error(f"Error cleaning up: {str(e)}")
+
+@bp.route('/api/projects', methods=['POST'])
+def start_project_delta():
+    """Take a manifest of path -> SHA-256 and list the files the server lacks."""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    manifest = data.get('files')
+    if not isinstance(manifest, dict) or not manifest:
+        return jsonify({'error': 'No files provided'}), 400
+    if len(manifest) > MAX_MANIFEST_FILES:
+        return jsonify({'error': f'Too many files (max {MAX_MANIFEST_FILES})'}), 400
+    
+    try:
+        return jsonify(project_cache.start(manifest, data.get('project_id')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/api/projects/<project_id>/files', methods=['POST'])
+def upload_project_files(project_id):
+    """Store files listed as missing; each part's filename is its manifest path."""
+    try:
+        for file in request.files.getlist('files'):
+            project_cache.add_file(project_id, file.filename or '', file.stream)
+        return jsonify({'missing': project_cache.missing(project_id)})
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-@app.route('/api/health', methods=['GET'])
+@bp.route('/api/projects/<project_id>/build', methods=['POST'])
+def build_project_delta(project_id):
+    """Package the project of the latest manifest, analyzing only changed files."""
+    try:
+        host, port, output_format = parse_build_options(request.form)
+        if project_cache.missing(project_id):
+            return jsonify({'error': 'Project files missing, upload them first'}), 400
+        cached_results = project_cache.results(project_id)
+        manifest = project_cache.manifest(project_id)
+        file_sizes = project_cache.file_sizes(project_id)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    changed_files = sum(
+        1 for path, content_hash in manifest.items()
+        if result_key(content_hash, path) not in cached_results
+    )
+    
+    workspace_path = workspaces.acquire()
+    try:
+        cost = estimate_tree_cost(file_sizes, changed_files)
+        workspaces.check_fits(cost['disk'])
+        
+        with admission.admit(cost):
+            files = project_cache.materialize(project_id, os.path.join(workspace_path, 'extracted'))
+            known_results = {
+                path: cached_results[result_key(content_hash, path)]
+                for path, content_hash in files.items()
+                if result_key(content_hash, path) in cached_results
+            }
+            
+            output_path, file_results = dockerize_extracted(
+                workspace_path, host, port, output_format, known_results=known_results
+            )
+            
+            # Remember the results of this version for the next delta
+            project_cache.store_results(project_id, {
+                result_key(files[path], path): result
+                for path, result in file_results.items()
+                if path in files
+            })
+        
+        response = send_from_workspace(output_path)
+        response.headers['X-Analyzed-Files'] = str(sum(1 for path in file_results if path not in known_results))
+        return response
+    
+    except AdmissionRejected as e:
+        return busy_response(e)
+    except WorkspaceFull as e:
+        return workspace_full_response(e)
+    except Exception as e:
+        current_app.logger.error(f"Error processing project: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        # Cleanup
+        workspaces.release(workspace_path)
+
+@bp.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy'})
 
+@bp.route('/api/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'admission': admission.metrics(),
+        'workspaces': workspaces.metrics(),
+        'uploads': upload_janitor.metrics(),
+        'projects': project_janitor.metrics()
+    })
+
+app = create_app()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)
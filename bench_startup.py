@@ -0,0 +1,110 @@
+"""Startup benchmark for DockerBuilder workers.
+
+Measures, over several runs:
+
+- import time of the ``app`` module in a fresh interpreter
+- time to first response of a cold worker (fresh interpreter, import, first
+  request that runs the analyzer)
+- time to first response of a worker forked from a warmed parent, which is
+  what gunicorn does with ``preload_app``
+
+Usage: python bench_startup.py [--runs N]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import tempfile
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+FIRST_REQUEST = '''
+import io
+client = app.test_client()
+response = client.post('/api/preview', data={
+    'files': [(io.BytesIO(b'flask\\n'), 'requirements.txt'), (io.BytesIO(b'import flask\\n'), 'app.py')]
+}, content_type='multipart/form-data')
+assert response.status_code == 200, response.get_json()
+'''
+
+
+def run_child(code, env):
+    """Run code in a fresh interpreter and return the JSON it prints."""
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=HERE, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_import(env):
+    code = 'import time, json\nstart = time.perf_counter()\nimport app\n' \
+           'print(json.dumps(time.perf_counter() - start))'
+    return run_child(code, env)
+
+
+def measure_cold_worker(env):
+    start = time.perf_counter()
+    code = 'import json\nfrom app import app\n' + FIRST_REQUEST + 'print(json.dumps(0))'
+    run_child(code, env)
+    return time.perf_counter() - start
+
+
+def measure_forked_worker(app):
+    """Fork from the current (warmed) process and time the child's first request."""
+    read_fd, write_fd = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        # Never return into the parent's code, whatever the request does
+        status = 1
+        try:
+            os.close(read_fd)
+            exec(FIRST_REQUEST, {'app': app})
+            os.write(write_fd, b'done')
+            status = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(status)
+
+    os.close(write_fd)
+    payload = os.read(read_fd, 4)
+    elapsed = time.perf_counter() - start
+    os.close(read_fd)
+    _, status = os.waitpid(pid, 0)
+    if payload != b'done' or status != 0:
+        raise RuntimeError(f"Forked worker failed its first request (wait status {status})")
+    return elapsed
+
+
+def report(name, samples):
+    samples_ms = [s * 1000 for s in samples]
+    print(f"{name:<38} median {statistics.median(samples_ms):8.1f} ms   "
+          f"min {min(samples_ms):8.1f} ms   max {max(samples_ms):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure worker startup time')
+    parser.add_argument('--runs', type=int, default=5, help='runs per measurement')
+    args = parser.parse_args()
+
+    # Keep benchmark workspaces out of the source tree
+    env = dict(os.environ, WORKSPACE_ROOT=tempfile.mkdtemp(prefix='dockerbuilder-bench-'))
+    os.environ.update(env)
+    os.chdir(HERE)
+
+    report('import app', [measure_import(env) for _ in range(args.runs)])
+    report('cold worker, first response', [measure_cold_worker(env) for _ in range(args.runs)])
+
+    sys.path.insert(0, HERE)
+    from app import app, warm_up
+    warm_up(app)
+    report('preloaded fork, first response', [measure_forked_worker(app) for _ in range(args.runs)])
+
+
+if __name__ == '__main__':
+    main()
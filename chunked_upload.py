@@ -0,0 +1,233 @@
+import os
+import re
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import hashlib
+from typing import Dict, List, Any, Optional
+
+from werkzeug.utils import secure_filename
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024  # 4MB
+# Keeps the number of chunks, and with it every status listing, small
+MIN_CHUNK_SIZE = 1024 * 1024  # 1MB
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadQuotaExceeded(Exception):
+    """Raised when a new upload would not fit in the space left for open uploads."""
+
+
+class ChunkedUploadManager:
+    """Resumable chunked uploads stored on disk.
+
+    Every upload lives in its own directory so that any gunicorn worker can
+    serve any chunk:
+
+        <base>/<upload_id>/meta.json   upload parameters
+        <base>/<upload_id>/data        preallocated target file
+        <base>/<upload_id>/chunks/<n>  SHA-256 of chunk n, written once stored
+    """
+
+    def __init__(self, base_folder: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_size: int = 2 * 1024 * 1024 * 1024,
+                 max_total_size: int = 8 * 1024 * 1024 * 1024,
+                 idle_timeout: float = 900.0):
+        self.base_folder = base_folder
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.max_total_size = max_total_size
+        self.idle_timeout = idle_timeout
+        os.makedirs(self.base_folder, exist_ok=True)
+
+    def _upload_dir(self, upload_id: str) -> str:
+        """Return the directory of an existing upload."""
+        if not UPLOAD_ID_PATTERN.match(upload_id or ''):
+            raise FileNotFoundError(f"Unknown upload: {upload_id}")
+        upload_dir = os.path.join(self.base_folder, upload_id)
+        if not os.path.isdir(upload_dir):
+            raise FileNotFoundError(f"Unknown upload: {upload_id}")
+        return upload_dir
+
+    def _load_meta(self, upload_id: str) -> Dict[str, Any]:
+        with open(os.path.join(self._upload_dir(upload_id), 'meta.json')) as f:
+            return json.load(f)
+
+    def _received_chunks(self, upload_dir: str) -> List[int]:
+        chunks_dir = os.path.join(upload_dir, 'chunks')
+        return sorted(int(name) for name in os.listdir(chunks_dir) if name.isdigit())
+
+    def discard_idle(self) -> int:
+        """Remove uploads that received no chunk for ``idle_timeout`` seconds.
+
+        Returns the number of uploads removed.
+        """
+        removed = 0
+        cutoff = time.time() - self.idle_timeout
+        for name in os.listdir(self.base_folder):
+            if not UPLOAD_ID_PATTERN.match(name):
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.base_folder, name)) < cutoff:
+                    self.discard(name)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def open_size(self) -> int:
+        """Return the total declared size of the uploads on disk."""
+        total = 0
+        for name in os.listdir(self.base_folder):
+            if not UPLOAD_ID_PATTERN.match(name):
+                continue
+            try:
+                total += self._load_meta(name)['size']
+            except (OSError, ValueError, KeyError):
+                # Half-created or just discarded
+                continue
+        return total
+
+    def create(self, filename: str, size: int, chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """Register a new upload and preallocate its target file."""
+        filename = secure_filename(filename or '')
+        if not filename:
+            raise ValueError("No file selected")
+        if size <= 0:
+            raise ValueError("File size must be positive")
+        if size > self.max_size:
+            raise ValueError(f"File too large (max {self.max_size} bytes)")
+
+        chunk_size = min(chunk_size or self.chunk_size, self.chunk_size)
+        if chunk_size < min(MIN_CHUNK_SIZE, self.chunk_size):
+            raise ValueError(f"Chunk size must be at least {min(MIN_CHUNK_SIZE, self.chunk_size)} bytes")
+
+        upload_id = uuid.uuid4().hex
+        upload_dir = os.path.join(self.base_folder, upload_id)
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'chunk_size': chunk_size,
+            'total_chunks': (size + chunk_size - 1) // chunk_size,
+        }
+
+        # Serialize the quota check with other workers creating uploads
+        with open(os.path.join(self.base_folder, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Abandoned uploads must not hold the quota until the janitor runs
+            self.discard_idle()
+            open_size = self.open_size()
+            if open_size + size > self.max_total_size:
+                raise UploadQuotaExceeded(
+                    f"Not enough space for open uploads ({open_size} of {self.max_total_size} bytes in use)"
+                )
+
+            os.makedirs(os.path.join(upload_dir, 'chunks'))
+            # Written first so the upload counts against the quota right away
+            with open(os.path.join(upload_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+
+        # Preallocate so chunks can be written in any order at their offset
+        with open(os.path.join(upload_dir, 'data'), 'wb') as f:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f.fileno(), 0, size)
+            else:
+                f.truncate(size)
+
+        return meta
+
+    def write_chunk(self, upload_id: str, offset: int, data: bytes,
+                    checksum: Optional[str] = None) -> Dict[str, Any]:
+        """Verify a chunk, write it at its offset and return the chunk counts."""
+        meta = self._load_meta(upload_id)
+        upload_dir = self._upload_dir(upload_id)
+        chunk_size = meta['chunk_size']
+
+        if offset < 0 or offset >= meta['size'] or offset % chunk_size:
+            raise ValueError(f"Invalid chunk offset: {offset}")
+
+        expected_length = min(chunk_size, meta['size'] - offset)
+        if len(data) != expected_length:
+            raise ValueError(f"Chunk at offset {offset} must be {expected_length} bytes, got {len(data)}")
+
+        digest = hashlib.sha256(data).hexdigest()
+        if checksum and checksum.lower() != digest:
+            raise ValueError(f"Checksum mismatch for chunk at offset {offset}")
+
+        fd = os.open(os.path.join(upload_dir, 'data'), os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, offset)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        # The marker is only written once the data is durable, so a chunk
+        # never shows up as received if the connection dropped mid-write
+        index = offset // chunk_size
+        marker_path = os.path.join(upload_dir, 'chunks', str(index))
+        with open(marker_path + '.tmp', 'w') as f:
+            f.write(digest)
+        os.replace(marker_path + '.tmp', marker_path)
+        # Markers land in chunks/, so the janitor only sees activity through this
+        os.utime(upload_dir)
+
+        return {
+            'received': len(self._received_chunks(upload_dir)),
+            'total_chunks': meta['total_chunks'],
+        }
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        """Return the upload parameters along with received and missing chunks."""
+        meta = self._load_meta(upload_id)
+        received = self._received_chunks(self._upload_dir(upload_id))
+        received_set = set(received)
+        meta['received'] = received
+        meta['missing'] = [i for i in range(meta['total_chunks']) if i not in received_set]
+        meta['complete'] = not meta['missing']
+        return meta
+
+    def in_progress(self, upload_id: str) -> bool:
+        """Return whether an upload still has chunks to receive."""
+        try:
+            return not self.status(upload_id)['complete']
+        except (OSError, ValueError):
+            return False
+
+    def finalize(self, upload_id: str) -> Dict[str, Any]:
+        """Complete an upload and return its file path and chunk digest.
+
+        The chunk digest is a SHA-256 over the concatenated binary SHA-256
+        digests of the chunks, in order, recorded as chunks arrived so the
+        file does not have to be re-read here. It is not the file's SHA-256.
+        """
+        status = self.status(upload_id)
+        if not status['complete']:
+            raise ValueError(f"Upload incomplete: {len(status['missing'])} chunk(s) missing")
+
+        upload_dir = self._upload_dir(upload_id)
+        chunks_dir = os.path.join(upload_dir, 'chunks')
+        digest = hashlib.sha256()
+        for index in range(status['total_chunks']):
+            with open(os.path.join(chunks_dir, str(index))) as f:
+                digest.update(bytes.fromhex(f.read().strip()))
+
+        # A finalize retried after a busy response finds the file already moved
+        filepath = os.path.join(upload_dir, status['filename'])
+        if not os.path.exists(filepath):
+            os.replace(os.path.join(upload_dir, 'data'), filepath)
+
+        return {
+            'filepath': filepath,
+            'filename': status['filename'],
+            'chunk_digest': digest.hexdigest(),
+        }
+
+    def discard(self, upload_id: str):
+        """Remove an upload and all of its chunks."""
+        try:
+            shutil.rmtree(self._upload_dir(upload_id))
+        except FileNotFoundError:
+            pass
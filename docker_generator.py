@@ -1,11 +1,10 @@
 import os
-import yaml
 from typing import Dict, List, Any
 
 class DockerGenerator:
-    def __init__(self, analysis_result: Dict[str, Any]):
+    def __init__(self, analysis_result: Dict[str, Any], output_dir: str = 'output'):
         self.analysis = analysis_result
-        self.output_dir = 'output'
+        self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
     
     def generate(self, host: str = '0.0.0.0', port: str = '5000') -> List[str]:
@@ -29,7 +28,7 @@ class DockerGenerator:
         
         return generated_files
     
-    def _detect_framework(self) -> str:
+    def detect_framework(self) -> str:
         """Detect the framework being used in the project."""
         files = [f['path'] for f in self.analysis.get('files', [])]
         dependencies = self.analysis.get('dependencies', [])
@@ -188,7 +187,7 @@ class DockerGenerator:
     def _generate_dockerignore(self, output_path: str):
         """Generate .dockerignore file."""
         project_type = self.analysis.get('language', 'unknown')
-        framework = self._detect_framework()
+        framework = self.detect_framework()
         
         ignore_patterns = [
             '.git',
@@ -0,0 +1,22 @@
+# Gunicorn settings for DockerBuilder (gunicorn --config gunicorn.conf.py app:app)
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+# Jobs waiting for admission hold a thread, not a whole worker, so the
+# admission queue (ADMISSION_MAX_QUEUE, 16 by default) can fill up and
+# answer 429 instead of leaving clients in the listen backlog; keep
+# workers * threads well above the jobs in flight plus the queue
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = 120
+
+# Load the app once in the master and fork workers from it, so a new or
+# recycled worker starts serving without importing anything
+preload_app = True
+
+
+def when_ready(server):
+    """Warm the preloaded app before the first workers are forked."""
+    from app import app, warm_up
+    warm_up(app)
@@ -1,18 +1,30 @@
 import os
 import json
-import yaml
-import magic
 import re
-import chardet
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+
+_mime_detector = None
+
+def get_mime_detector():
+    """Return the libmagic handle shared by every analyzer in the process.
+    
+    Opening a handle loads the whole magic database, so it is done once, on
+    first use; a handle opened before fork is shared by the workers.
+    """
+    global _mime_detector
+    if _mime_detector is None:
+        import magic
+        _mime_detector = magic.Magic(mime=True)
+    return _mime_detector
 
 class ProjectAnalyzer:
     def __init__(self, project_path: str):
         self.project_path = project_path
-        self.mime = magic.Magic(mime=True)
+        self.mime = get_mime_detector()
         
     def detect_encoding(self, file_path: str) -> str:
         """Detect the encoding of a file."""
+        import chardet
         try:
             with open(file_path, 'rb') as f:
                 raw_data = f.read()
@@ -97,8 +109,22 @@ class ProjectAnalyzer:
         
         return dependencies
     
-    def analyze(self) -> Dict[str, Any]:
-        """Analyze the project and return the results."""
+    def analyze_file(self, file_path: str) -> Dict[str, Any]:
+        """Classify a single file and find the dependencies it declares."""
+        language = self.detect_language(file_path)
+        return {
+            'language': language,
+            'dependencies': self.find_dependencies(file_path, language)
+        }
+    
+    def analyze(self, known_results: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Analyze the project and return the results.
+        
+        known_results maps file paths, relative to the project root, to the
+        result of analyze_file() for files that are known to be unchanged;
+        only the other files are read and classified.
+        """
+        known_results = known_results or {}
         results = {
             'language': 'unknown',
             'dependencies': [],
@@ -121,13 +147,15 @@ class ProjectAnalyzer:
                 file_path = os.path.join(root, file)
                 rel_file_path = os.path.join(rel_path, file)
                 
-                # Detect language
-                language = self.detect_language(file_path)
+                # Detect language and find dependencies
+                file_result = known_results.get(os.path.normpath(rel_file_path))
+                if file_result is None:
+                    file_result = self.analyze_file(file_path)
+                language = file_result['language']
+                deps = list(file_result['dependencies'])
+                
                 if language != 'unknown' and results['language'] == 'unknown':
                     results['language'] = language
-                
-                # Find dependencies
-                deps = self.find_dependencies(file_path, language)
                 results['dependencies'].extend(deps)
                 
                 # Add file to structure
@@ -0,0 +1,221 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import hashlib
+from typing import Dict, List, Any, BinaryIO, Optional
+
+PROJECT_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def validate_relative_path(path: str) -> str:
+    """Check a client-supplied relative path and return it unchanged.
+
+    Components are kept as they are, since project files such as
+    ``__init__.py`` or ``.env`` must keep their names. Raises ValueError for
+    absolute paths, empty, ``.`` or ``..`` components and NUL bytes.
+    """
+    parts = path.split('/')
+    if '\0' in path or any(part in ('', '.', '..') for part in parts):
+        raise ValueError(f"Invalid file path: {path!r}")
+    return os.path.join(*parts)
+
+
+def check_manifest_paths(paths: List[str]):
+    """Raise ValueError unless every path is valid and none is a directory of another."""
+    paths = set(paths)
+    for path in paths:
+        validate_relative_path(path)
+        parent = os.path.dirname(path)
+        while parent:
+            if parent in paths:
+                raise ValueError(f"File path is also a directory: {parent!r}")
+            parent = os.path.dirname(parent)
+
+
+def result_key(content_hash: str, path: str) -> str:
+    """Key of a per-file analysis result.
+
+    Classification depends on the file name as well as its content, so the
+    same content under another name is analyzed again.
+    """
+    return f"{content_hash}:{os.path.basename(path)}"
+
+
+class ProjectCache:
+    """Content-addressed store of project files and per-file analysis results.
+
+    Lets a client re-dockerize a project by sending a manifest of
+    path -> SHA-256 and then only the files the server has not seen:
+
+        <base>/<project_id>/manifest.json  latest manifest from the client
+        <base>/<project_id>/blobs/<sha256> file contents
+        <base>/<project_id>/results.json   ProjectAnalyzer.analyze_file() results
+    """
+
+    def __init__(self, base_folder: str):
+        self.base_folder = base_folder
+        os.makedirs(self.base_folder, exist_ok=True)
+
+    def _project_dir(self, project_id: str) -> str:
+        """Return the directory of an existing project."""
+        if not PROJECT_ID_PATTERN.match(project_id or ''):
+            raise FileNotFoundError(f"Unknown project: {project_id}")
+        project_dir = os.path.join(self.base_folder, project_id)
+        if not os.path.isdir(project_dir):
+            raise FileNotFoundError(f"Unknown project: {project_id}")
+        return project_dir
+
+    def _blob_path(self, project_dir: str, content_hash: str) -> str:
+        return os.path.join(project_dir, 'blobs', content_hash)
+
+    def _write_json(self, path: str, data: Any):
+        with open(path + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(path + '.tmp', path)
+
+    def manifest(self, project_id: str) -> Dict[str, str]:
+        with open(os.path.join(self._project_dir(project_id), 'manifest.json')) as f:
+            return json.load(f)
+
+    def start(self, manifest: Dict[str, str], project_id: Optional[str] = None) -> Dict[str, Any]:
+        """Record a new manifest and return the paths whose content is missing.
+
+        Unknown or expired project ids start a new project.
+        """
+        for path, content_hash in manifest.items():
+            if not isinstance(content_hash, str) or not SHA256_PATTERN.match(content_hash):
+                raise ValueError(f"Invalid SHA-256 for {path}")
+        check_manifest_paths(list(manifest))
+
+        try:
+            project_dir = self._project_dir(project_id)
+        except FileNotFoundError:
+            project_id = uuid.uuid4().hex
+            project_dir = os.path.join(self.base_folder, project_id)
+            os.makedirs(os.path.join(project_dir, 'blobs'))
+
+        self._write_json(os.path.join(project_dir, 'manifest.json'), manifest)
+        # Keeps recently used projects away from the janitor
+        os.utime(project_dir)
+
+        return {'project_id': project_id, 'missing': self.missing(project_id)}
+
+    def file_sizes(self, project_id: str) -> List[int]:
+        """Return the sizes of the stored files of the current manifest."""
+        project_dir = self._project_dir(project_id)
+        return [
+            os.path.getsize(self._blob_path(project_dir, content_hash))
+            for content_hash in set(self.manifest(project_id).values())
+        ]
+
+    def missing(self, project_id: str) -> List[str]:
+        """Return the manifest paths whose content is not stored yet."""
+        project_dir = self._project_dir(project_id)
+        return sorted(
+            path for path, content_hash in self.manifest(project_id).items()
+            if not os.path.exists(self._blob_path(project_dir, content_hash))
+        )
+
+    def _store_blob(self, project_dir: str, stream: BinaryIO, expected: Optional[str] = None) -> str:
+        """Store a stream under its SHA-256 and return the hash.
+
+        Raises ValueError if the content does not match ``expected``.
+        """
+        tmp_path = os.path.join(project_dir, 'blobs', f".{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        try:
+            with open(tmp_path, 'wb') as f:
+                for block in iter(lambda: stream.read(64 * 1024), b''):
+                    digest.update(block)
+                    f.write(block)
+            content_hash = digest.hexdigest()
+            if expected is not None and content_hash != expected:
+                raise ValueError("Checksum mismatch")
+            os.replace(tmp_path, self._blob_path(project_dir, content_hash))
+            return content_hash
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def add_file(self, project_id: str, path: str, stream: BinaryIO):
+        """Store the content of a manifest path after checking its hash."""
+        project_dir = self._project_dir(project_id)
+        expected = self.manifest(project_id).get(path)
+        if expected is None:
+            raise ValueError(f"Not in manifest: {path}")
+        try:
+            self._store_blob(project_dir, stream, expected)
+        except ValueError:
+            raise ValueError(f"Checksum mismatch for {path}") from None
+
+    def import_tree(self, root: str) -> str:
+        """Start a new project from the regular files below root and return its id.
+
+        Used after a full upload, so that the next build of the same project
+        can be sent as a delta.
+        """
+        project_id = uuid.uuid4().hex
+        project_dir = os.path.join(self.base_folder, project_id)
+        os.makedirs(os.path.join(project_dir, 'blobs'))
+
+        manifest = {}
+        for dirpath, _, files in os.walk(root):
+            for file in files:
+                file_path = os.path.join(dirpath, file)
+                if os.path.islink(file_path) or not os.path.isfile(file_path):
+                    continue
+                path = os.path.relpath(file_path, root).replace(os.sep, '/')
+                with open(file_path, 'rb') as f:
+                    manifest[path] = self._store_blob(project_dir, f)
+
+        self._write_json(os.path.join(project_dir, 'manifest.json'), manifest)
+        return project_id
+
+    def materialize(self, project_id: str, dest: str) -> Dict[str, str]:
+        """Recreate the manifest's file tree under dest.
+
+        Returns the manifest keyed by the paths the files were written to,
+        relative to dest.
+        """
+        project_dir = self._project_dir(project_id)
+        if self.missing(project_id):
+            raise ValueError("Project files missing, upload them first")
+
+        written = {}
+        for path, content_hash in self.manifest(project_id).items():
+            rel_path = validate_relative_path(path)
+            blob_path = self._blob_path(project_dir, content_hash)
+            file_path = os.path.join(dest, rel_path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            if os.path.lexists(file_path):
+                # Never write through a link into the blob store
+                os.remove(file_path)
+            try:
+                # Hard links are free when the workspace is on the same filesystem
+                os.link(blob_path, file_path)
+            except OSError:
+                shutil.copyfile(blob_path, file_path)
+            written[rel_path] = content_hash
+        return written
+
+    def results(self, project_id: str) -> Dict[str, Dict[str, Any]]:
+        """Return cached per-file results keyed by result_key()."""
+        try:
+            with open(os.path.join(self._project_dir(project_id), 'results.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def store_results(self, project_id: str, results: Dict[str, Dict[str, Any]]):
+        """Replace the cached per-file results and drop unreferenced blobs."""
+        project_dir = self._project_dir(project_id)
+        self._write_json(os.path.join(project_dir, 'results.json'), results)
+
+        referenced = set(self.manifest(project_id).values())
+        blobs_dir = os.path.join(project_dir, 'blobs')
+        for name in os.listdir(blobs_dir):
+            if SHA256_PATTERN.match(name) and name not in referenced:
+                os.remove(os.path.join(blobs_dir, name))
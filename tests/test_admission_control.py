@@ -0,0 +1,89 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+
+from admission_control import AdmissionController, AdmissionRejected
+
+
+def job_cost(cpu):
+    return {'cpu': cpu, 'memory': 0, 'disk': 0}
+
+
+class AdmissionControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.controller = AdmissionController(
+            os.path.join(self.tmpdir.name, 'admission.json'),
+            budgets={'cpu': 10, 'memory': 1, 'disk': 1},
+            queue_timeout=5,
+            max_queue=2,
+            poll_interval=0.01
+        )
+        self.admitted = []
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def start_job(self, name, cpu, release):
+        def run():
+            with self.controller.admit(job_cost(cpu)):
+                self.admitted.append(name)
+                release.wait(5)
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def wait_for(self, condition):
+        deadline = time.time() + 5
+        while not condition():
+            if time.time() > deadline:
+                self.fail('timed out')
+            time.sleep(0.01)
+
+    def test_later_small_job_does_not_pass_waiting_large_job(self):
+        release_first, release_large, release_small = threading.Event(), threading.Event(), threading.Event()
+        first = self.start_job('first', 6, release_first)
+        self.wait_for(lambda: self.admitted == ['first'])
+
+        large = self.start_job('large', 8, release_large)
+        self.wait_for(lambda: self.controller.metrics()['queue_depth'] == 1)
+
+        # Fits next to the first job, but the large job was there before it
+        small = self.start_job('small', 4, release_small)
+        self.wait_for(lambda: self.controller.metrics()['queue_depth'] == 2)
+        time.sleep(0.1)
+        self.assertEqual(self.admitted, ['first'])
+
+        release_first.set()
+        self.wait_for(lambda: len(self.admitted) == 2)
+        self.assertEqual(self.admitted, ['first', 'large'])
+
+        release_large.set()
+        self.wait_for(lambda: len(self.admitted) == 3)
+        release_small.set()
+        for thread in (first, large, small):
+            thread.join()
+        self.assertEqual(self.admitted, ['first', 'large', 'small'])
+
+    def test_rejects_when_queue_is_full(self):
+        release = threading.Event()
+        first = self.start_job('first', 10, release)
+        self.wait_for(lambda: self.admitted == ['first'])
+        waiting = [self.start_job(f'waiting{i}', 10, release) for i in range(2)]
+        self.wait_for(lambda: self.controller.metrics()['queue_depth'] == 2)
+
+        with self.assertRaises(AdmissionRejected) as context:
+            with self.controller.admit(job_cost(1)):
+                pass
+        self.assertGreaterEqual(context.exception.retry_after, 1)
+
+        release.set()
+        for thread in [first] + waiting:
+            thread.join()
+        self.assertEqual(self.controller.metrics()['rejected_total'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+import threading
+from typing import Dict, Any, Callable, Optional
+
+OWNER_FILE = '.owner'
+
+
+class WorkspaceFull(Exception):
+    """Raised when a job would not fit in its workspace size cap."""
+
+
+def directory_size(path: str) -> int:
+    """Return the total size in bytes of the files below a directory."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(root, file)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def memory_root() -> str:
+    """Return a RAM-backed directory for workspaces, preferring /dev/shm."""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'dockerbuilder')
+
+
+class WorkspaceManager:
+    """Per-request scratch directories with a background janitor.
+
+    Each request gets ``<root>/<id>/`` with ``upload``, ``extracted`` and
+    ``output`` subdirectories, owned by the worker process that created it.
+    The root can sit on disk or on tmpfs. The janitor removes workspaces whose
+    owner died (leaks), workspaces older than ``max_age``, and, while the root
+    exceeds ``total_budget`` bytes, the oldest workspaces past
+    ``min_evict_age``. Directories for which ``in_use(path)`` is true are
+    never evicted for the budget.
+    """
+
+    SUBDIRS = ('upload', 'extracted', 'output')
+
+    def __init__(self, root: str, max_bytes: int, total_budget: int, max_age: float = 3600.0,
+                 min_evict_age: float = 120.0, interval: float = 30.0,
+                 logger: Optional[logging.Logger] = None,
+                 in_use: Optional[Callable[[str], bool]] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.total_budget = total_budget
+        self.max_age = max_age
+        self.min_evict_age = min_evict_age
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.in_use = in_use or (lambda path: False)
+        self.counters = {'created': 0, 'released': 0, 'evicted': 0, 'leaked': 0}
+        self._janitor_pid = None
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def acquire(self) -> str:
+        """Create a new workspace and return its path."""
+        path = os.path.join(self.root, uuid.uuid4().hex)
+        for subdir in self.SUBDIRS:
+            os.makedirs(os.path.join(path, subdir))
+        with open(os.path.join(path, OWNER_FILE), 'w') as f:
+            json.dump({'pid': os.getpid(), 'created': time.time()}, f)
+        with self._lock:
+            self.counters['created'] += 1
+        return path
+
+    def check_fits(self, required_bytes: int):
+        """Raise WorkspaceFull if a job needs more than the per-workspace cap.
+
+        Nothing is reserved: the janitor and admission control's disk budget
+        keep the total in check.
+        """
+        if required_bytes > self.max_bytes:
+            raise WorkspaceFull(
+                f"Project needs about {required_bytes} bytes of workspace, limit is {self.max_bytes}"
+            )
+
+    def release(self, path: str):
+        """Remove a workspace once its request is done with it."""
+        shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self.counters['released'] += 1
+
+    def _owner(self, path: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(path, OWNER_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Half-created or foreign directories age out by mtime
+            return {'pid': None, 'created': os.path.getmtime(path)}
+
+    @staticmethod
+    def _pid_alive(pid: Optional[int]) -> bool:
+        if pid is None:
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _evict(self, path: str, reason: str, size: int):
+        shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self.counters['evicted'] += 1
+            if reason != 'budget':
+                self.counters['leaked'] += 1
+        if reason == 'budget':
+            self.logger.info(f"Evicted workspace {path} ({size} bytes) to stay within budget")
+        else:
+            self.logger.warning(f"Evicted leaked workspace {path} ({size} bytes): {reason}")
+
+    def sweep(self) -> Dict[str, int]:
+        """Run one janitor pass and return the remaining workspace usage."""
+        now = time.time()
+        workspaces = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                continue
+            try:
+                owner = self._owner(path)
+                size = directory_size(path)
+            except FileNotFoundError:
+                # Released while we were looking at it
+                continue
+            age = now - owner['created']
+
+            if not self._pid_alive(owner['pid']):
+                self._evict(path, f"owner process {owner['pid']} is gone", size)
+            elif age > self.max_age:
+                self._evict(path, f"older than {int(self.max_age)}s", size)
+            else:
+                workspaces.append((owner['created'], path, size))
+
+        total = sum(size for _, _, size in workspaces)
+        for created, path, size in sorted(workspaces):
+            if total <= self.total_budget:
+                break
+            if now - created < self.min_evict_age or self.in_use(path):
+                continue
+            self._evict(path, 'budget', size)
+            total -= size
+
+        return {'workspaces': len(workspaces), 'total_bytes': total}
+
+    def _run_janitor(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                self.logger.error(f"Workspace janitor failed: {str(e)}")
+            time.sleep(self.interval)
+
+    def start_janitor(self):
+        """Start the janitor thread for this process if it is not running.
+
+        Threads do not survive fork, so this is keyed on the current pid.
+        """
+        with self._lock:
+            if self._janitor_pid == os.getpid():
+                return
+            self._janitor_pid = os.getpid()
+        thread = threading.Thread(target=self._run_janitor, name='workspace-janitor', daemon=True)
+        thread.start()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return workspace usage on the root and this process's counters."""
+        names = [n for n in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, n))]
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(counters, root=self.root, workspaces=len(names), total_bytes=directory_size(self.root))